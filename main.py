@@ -1,6 +1,7 @@
 import os
+import json
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
 app = FastAPI(
     title="Money Monitor API",
@@ -8,22 +9,84 @@ app = FastAPI(
     version="1.0.0"
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+class FastCORSMiddleware:
+    """Pure-ASGI CORS: any origin, no credentials"""
+
+    def __init__(self, app):
+        self.app = app
+        self.allow_origin = (b"access-control-allow-origin", b"*")
+        self.preflight_headers = [
+            self.allow_origin,
+            (b"access-control-allow-methods", b"*"),
+            (b"access-control-allow-headers", b"*"),
+            (b"access-control-max-age", b"600"),
+            (b"content-length", b"0"),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if b"origin" not in headers:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and b"access-control-request-method" in headers:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": self.preflight_headers
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append(self.allow_origin)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+HEALTH_STATUS = {
+    "status": "healthy",
+    "service": "Money Monitor API",
+    "version": "1.0.0"
+}
+
+class HealthShortcut:
+    """Answer GET /health with a prebuilt response, bypassing routing"""
+
+    def __init__(self, app):
+        self.app = app
+        body = json.dumps(HEALTH_STATUS).encode()
+        self.resp_start = {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode())
+            ]
+        }
+        self.body = {"type": "http.response.body", "body": body}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/health" and scope["method"] == "GET":
+            await send({**self.resp_start, "headers": list(self.resp_start["headers"])})
+            await send(self.body)
+            return
+        await self.app(scope, receive, send)
+
+app.add_middleware(HealthShortcut)
+app.add_middleware(FastCORSMiddleware)
 
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
-        "service": "Money Monitor API",
-        "version": "1.0.0"
-    }
+    return HEALTH_STATUS
+
+_ROOT_BODY = json.dumps({"status": "running"}).encode()
 
 @app.get("/")
 async def root():
-    return {"status": "running"}
+    return Response(content=_ROOT_BODY, media_type="application/json")
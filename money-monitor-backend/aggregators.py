@@ -0,0 +1,80 @@
+"""
+Money Monitor - Rollup aggregation
+Pure loops over plain expense rows, kept free of Firestore types so the
+module can be compiled with mypyc (`mypyc aggregators.py`). Python picks
+up the compiled extension when it is present and this source otherwise.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+# (type, category, yearMonth, amount), e.g. ("personal", "transport", "2025-01", 150.5)
+Row = Tuple[str, str, str, float]
+
+class _Bucket:
+    """Running total and count; a native class with unboxed fields under mypyc"""
+
+    def __init__(self) -> None:
+        self.total: float = 0.0
+        self.count: int = 0
+
+    def add(self, amount: float) -> None:
+        self.total += amount
+        self.count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'total': self.total, 'count': self.count}
+
+class _Scope(_Bucket):
+    """A bucket broken down by category and month (the whole rollup, or one type)"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.by_category: Dict[str, _Bucket] = {}
+        self.by_month: Dict[str, _Bucket] = {}
+
+    def add_row(self, category: str, month_key: str, amount: float) -> None:
+        self.add(amount)
+        
+        bucket = self.by_category.get(category)
+        if bucket is None:
+            bucket = self.by_category[category] = _Bucket()
+        bucket.add(amount)
+        
+        if month_key:
+            bucket = self.by_month.get(month_key)
+            if bucket is None:
+                bucket = self.by_month[month_key] = _Bucket()
+            bucket.add(amount)
+
+    def to_dict(self) -> Dict[str, Any]:
+        doc = super().to_dict()
+        doc['byCategory'] = {key: b.to_dict() for key, b in self.by_category.items()}
+        if self.by_month:
+            doc['byMonth'] = {key: b.to_dict() for key, b in self.by_month.items()}
+        return doc
+
+def aggregate_rollup(rows: List[Row]) -> Dict[str, Any]:
+    """
+    Build a rollup document (see main.py) from expense rows
+
+    Rows with an empty type are left out of byType, rows with an empty
+    yearMonth are left out of byMonth.
+    """
+    if not rows:
+        return {}
+    
+    overall = _Scope()
+    by_type: Dict[str, _Scope] = {}
+    
+    for type_, category, month_key, amount in rows:
+        overall.add_row(category, month_key, amount)
+        if type_:
+            scope = by_type.get(type_)
+            if scope is None:
+                scope = by_type[type_] = _Scope()
+            scope.add_row(category, month_key, amount)
+    
+    rollup = overall.to_dict()
+    if by_type:
+        rollup['byType'] = {key: s.to_dict() for key, s in by_type.items()}
+    return rollup
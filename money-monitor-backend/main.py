@@ -3,65 +3,455 @@ Money Monitor - FastAPI Backend
 Handles all business logic, AI queries, and Firestore integration
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, ValidationError
+from typing import Optional, List, Literal
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
-from datetime import datetime, timedelta
+from google.api_core.exceptions import NotFound, ServiceUnavailable
+from google.cloud.firestore_v1.services.firestore import async_client as firestore_gapic
+from google.cloud.firestore_v1.services.firestore.transports import FirestoreGrpcAsyncIOTransport
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
+from contextlib import asynccontextmanager
+import asyncio
+import functools
+import itertools
+import logging
+import orjson
+from cachetools import TTLCache
 import os
 from dotenv import load_dotenv
+from aggregators import aggregate_rollup
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+UTC = timezone.utc
+_SERVER_TS = firestore.SERVER_TIMESTAMP
+_DESC = firestore.Query.DESCENDING
+
+# ============================================================================
+# FIREBASE
+# ============================================================================
+
+# Number of gRPC channels (one HTTP/2 connection each) per worker process.
+# Requests are spread round-robin so one channel's stream limit does not
+# cap concurrency.
+FIRESTORE_POOL_SIZE = min(50, int(os.getenv("FIRESTORE_POOL_SIZE", "4")))
+
+FIRESTORE_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+    # Without this, channels with identical options share one subchannel
+    # (and TCP connection) through gRPC's global pool
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+class PooledTransport(FirestoreGrpcAsyncIOTransport):
+    """Async gRPC transport whose channels use FIRESTORE_CHANNEL_OPTIONS"""
+
+    @classmethod
+    def create_channel(cls, host, **kwargs):
+        kwargs["options"] = FIRESTORE_CHANNEL_OPTIONS
+        return super().create_channel(host, **kwargs)
+
+class PooledAsyncClient(firestore.AsyncClient):
+    """
+    AsyncClient that builds its channel through PooledTransport
+
+    Goes through the library's own _firestore_api_helper (emulator and
+    client info handling included); the hook is private, which is why
+    google-cloud-firestore is pinned in requirements.txt.
+    """
+
+    @property
+    def _firestore_api(self):
+        return self._firestore_api_helper(
+            PooledTransport, firestore_gapic.FirestoreAsyncClient, firestore_gapic
+        )
+
+class FirestorePool:
+    """
+    Round-robin over several async clients
+
+    Take one client per request with client() and use it for everything in
+    that request, so batches and the refs they write belong to one client.
+    """
+
+    def __init__(self, clients):
+        self.clients = clients
+        self.client = itertools.cycle(clients).__next__
+
+@functools.lru_cache(maxsize=1)
+def get_db():
+    """
+    Initialize Firebase once per process and return a pool of async
+    Firestore clients
+
+    Credentials come from FIREBASE_CREDENTIALS (service-account JSON),
+    then the FIREBASE_CREDENTIALS_PATH file, then Application Default
+    Credentials.
+    """
+    if not firebase_admin._apps:
+        cred_json = os.getenv("FIREBASE_CREDENTIALS")
+        cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "firebase-credentials.json")
+        
+        if cred_json:
+            cred = credentials.Certificate(orjson.loads(cred_json))
+        elif os.path.isfile(cred_path):
+            with open(cred_path, 'rb') as f:
+                cred = credentials.Certificate(orjson.loads(f.read()))
+        else:
+            cred = credentials.ApplicationDefault()
+        
+        firebase_admin.initialize_app(cred)
+    
+    # Async clients so every call can be awaited instead of blocking the
+    # event loop for the round-trip
+    fb_app = firebase_admin.get_app()
+    cred = fb_app.credential.get_credential()
+    return FirestorePool([
+        PooledAsyncClient(credentials=cred, project=fb_app.project_id)
+        for _ in range(max(1, FIRESTORE_POOL_SIZE))
+    ])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db = get_db()
+    yield
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Money Monitor API",
     description="Expense tracking backend with AI support",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+HEALTH_STATUS = {
+    "status": "healthy",
+    "service": "Money Monitor API",
+    "version": "1.0.0"
+}
+_HEALTH_BODY = orjson.dumps(HEALTH_STATUS)
+
+class FastCORSMiddleware:
+    """
+    Pure-ASGI CORS for the Flutter app
+
+    Allows any origin without credentials. Preflights are answered directly
+    and other responses only get the allow-origin header appended, so no
+    Request/Response objects are built per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.allow_origin = (b"access-control-allow-origin", b"*")
+        self.preflight_headers = [
+            self.allow_origin,
+            (b"access-control-allow-methods", b"*"),
+            (b"access-control-allow-headers", b"*"),
+            (b"access-control-max-age", b"600"),
+            (b"content-length", b"0"),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if b"origin" not in headers:
+            # Not a cross-origin request, nothing to add
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and b"access-control-request-method" in headers:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": self.preflight_headers
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append(self.allow_origin)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+class HealthShortcut:
+    """
+    Answer GET /health before FastAPI routing
+
+    Load balancers poll it constantly, so the response is prebuilt once
+    and sent without route matching or serialization.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        body = _HEALTH_BODY
+        self.resp_start = {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode())
+            ]
+        }
+        self.body = {"type": "http.response.body", "body": body}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/health" and scope["method"] == "GET":
+            # Copy so CORS appending a header does not grow the shared list
+            await send({**self.resp_start, "headers": list(self.resp_start["headers"])})
+            await send(self.body)
+            return
+        await self.app(scope, receive, send)
+
+class ErrorEnvelopeMiddleware:
+    """
+    Turn exceptions escaping a handler into a JSON error envelope
+
+    {"success": false, "error": "<exception type>", "detail": "<message>"}
+    with 400 for bad input, 404 for missing Firestore documents, 503 when
+    Firestore is unavailable and 500 for anything else. Handlers raise
+    instead of wrapping their bodies in try/except.
+    """
+
+    STATUS_BY_ERROR = [
+        (ValueError, 400),
+        (ValidationError, 400),
+        (NotFound, 404),
+        (ServiceUnavailable, 503),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_tracking(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking)
+        except Exception as e:
+            # Too late for an envelope once a (streaming) response has begun
+            if started:
+                raise
+
+            status = next((code for error, code in self.STATUS_BY_ERROR if isinstance(e, error)), 500)
+            if status == 500:
+                logger.exception("Unhandled error on %s %s", scope["method"], scope["path"])
+
+            body = orjson.dumps({"success": False, "error": type(e).__name__, "detail": str(e)})
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+
+# Added innermost first so CORS still wraps them
+app.add_middleware(ErrorEnvelopeMiddleware)
+app.add_middleware(HealthShortcut)
+
 # Enable CORS for Flutter app
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(FastCORSMiddleware)
+
+# Per-process read caches. Each worker holds its own copy, so a write made
+# through another worker is seen here once the TTL runs out.
+_merchant_cache = TTLCache(maxsize=50_000, ttl=900)  # merchant doc ID -> (category, type, exists)
+_totals_cache = TTLCache(maxsize=10_000, ttl=60)     # userId -> totals dict
+_user_refs = TTLCache(maxsize=40_000, ttl=3600)      # (client id, userId) -> (expenses ref, rollup ref)
+
+def user_refs(db, userId: str):
+    """
+    Expenses collection and rollup document refs for a user
+
+    Reference construction validates the path on every call, so the pair
+    is built once per user and client and reused. Refs are bound to the
+    client that made them, hence the client in the key.
+    """
+    key = (id(db), userId)
+    refs = _user_refs.get(key)
+    if refs is None:
+        user = db.collection('users').document(userId)
+        refs = (user.collection('expenses'), user.collection('rollups').document('summary'))
+        _user_refs[key] = refs
+    return refs
+
+def expenses_ref(db, userId: str):
+    return user_refs(db, userId)[0]
+
+# ============================================================================
+# ROLLUPS
+# ============================================================================
+
+# users/{uid}/rollups/summary holds running totals so the summary endpoints
+# read one document instead of the whole expenses collection:
+# {
+#     "total": 500.0, "count": 7,
+#     "byCategory": {"transport": {"total": 150.5, "count": 1}, ...},
+#     "byMonth": {"2025-01": {"total": 150.5, "count": 1}, ...},
+#     "byType": {"personal": {"total", "count", "byCategory", "byMonth"}, ...}
+# }
+
+def rollup_ref(db, userId: str):
+    return user_refs(db, userId)[1]
+
+def expense_row(expense: dict):
+    """
+    Reduce an expense document to the (type, category, yearMonth, amount)
+    row that aggregate_rollup works on
+    """
+    return (
+        expense.get('type') or '',
+        expense.get('category') or 'uncategorized',
+        (expense.get('date') or '')[:7],  # "2025-01"
+        float(expense.get('amount', 0))
+    )
+
+def as_increments(rollup: dict) -> dict:
+    """
+    Turn a plain-number rollup into Increments for set(..., merge=True)
+
+    Map keys are literal, so category names containing dots are safe.
+    """
+    return {
+        key: as_increments(value) if isinstance(value, dict) else firestore.Increment(value)
+        for key, value in rollup.items()
+    }
+
+# Firestore rejects a commit with more than 500 field transforms on one document
+MAX_DOC_TRANSFORMS = 500
+
+def _rollup_leaves(rollup: dict, path: tuple = ()):
+    for key, value in rollup.items():
+        if isinstance(value, dict):
+            yield from _rollup_leaves(value, path + (key,))
+        else:
+            yield path + (key,), value
+
+def split_rollup(rollup: dict, max_leaves: int = MAX_DOC_TRANSFORMS) -> List[dict]:
+    """
+    Split a plain-number rollup into partial rollups of at most max_leaves
+    numbers each, so each one's Increments fit in a single commit
+
+    Applying every part with set(..., merge=True) equals applying the whole.
+    """
+    leaves = list(_rollup_leaves(rollup))
+    parts = []
+    for start in range(0, len(leaves), max_leaves):
+        part = {}
+        for path, value in leaves[start:start + max_leaves]:
+            node = part
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            node[path[-1]] = value
+        parts.append(part)
+    return parts
 
-# Initialize Firebase
-firebase_config_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "firebase-credentials.json")
-if not firebase_admin._apps:
+async def get_rollup(db, userId: str, type: Optional[str] = None) -> dict:
+    """
+    Read the user's rollup, optionally narrowed to one expense type
+    """
+    rollup = (await rollup_ref(db, userId).get()).to_dict() or {}
+    return rollup_scope(rollup, type)
+
+def rollup_scope(rollup: dict, type: Optional[str] = None) -> dict:
+    if type:
+        return rollup.get('byType', {}).get(type, {})
+    return rollup
+
+def totals_from_rollup(rollup: dict) -> dict:
+    by_type = rollup.get('byType', {})
+    return {
+        "total": rollup.get('total', 0),
+        "personal": by_type.get('personal', {}).get('total', 0),
+        "business": by_type.get('business', {}).get('total', 0)
+    }
 
-    cred = credentials.Certificate(firebase_config_path)
-    firebase_admin.initialize_app(cred)
+def category_breakdown(scope: dict) -> dict:
+    """
+    Per-category total and count with each category's share of the scope total
+    """
+    total = scope.get('total', 0)
+    categories = {}
+    
+    for category, data in scope.get('byCategory', {}).items():
+        percentage = (data['total'] / total * 100) if total > 0 else 0
+        categories[category] = {
+            'total': data['total'],
+            'count': data['count'],
+            'percentage': round(percentage, 2)
+        }
+    
+    return categories
 
-db = firestore.client()
+def monthly_breakdown(scope: dict) -> dict:
+    # Sort by month
+    return dict(sorted(scope.get('byMonth', {}).items()))
 
 # ============================================================================
 # DATA MODELS
 # ============================================================================
 
+# Request bodies are read-only once parsed
+MODEL_CONFIG = ConfigDict(extra='ignore', str_strip_whitespace=False, validate_assignment=False, frozen=True)
+
+ExpenseType = Literal["personal", "business"]
+ExpenseSource = Literal["manual", "sms"]
+
 class Expense(BaseModel):
+    model_config = MODEL_CONFIG
+    
     item: str
     amount: float
-    type: str  # "personal" or "business"
+    type: ExpenseType
     category: str
     note: str = ""
-    source: str = "manual"  # "manual" or "sms"
+    source: ExpenseSource = "manual"
 
 class Company(BaseModel):
+    model_config = MODEL_CONFIG
+    
     name: str
     subscriptionStatus: str = "free"  # free, trial, active
 
 class CompanyUser(BaseModel):
+    model_config = MODEL_CONFIG
+    
     userId: str
     role: str  # "owner", "manager", "employee"
 
 class MerchantQuery(BaseModel):
+    model_config = MODEL_CONFIG
+    
     merchant: str
     userId: Optional[str] = None
     companyId: Optional[str] = None
@@ -69,6 +459,8 @@ class MerchantQuery(BaseModel):
     endDate: Optional[str] = None
 
 class NLQuestion(BaseModel):
+    model_config = MODEL_CONFIG
+    
     question: str
     userId: Optional[str] = None
     companyId: Optional[str] = None
@@ -81,19 +473,38 @@ class NLQuestion(BaseModel):
 async def health_check():
     """
     Health check endpoint
+
+    GET requests are answered by HealthShortcut; kept for the API docs.
     """
-    return {
-        "status": "healthy",
-        "service": "Money Monitor API",
-        "version": "1.0.0"
-    }
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 # ============================================================================
 # EXPENSE ENDPOINTS
 # ============================================================================
 
+# Firestore's limit on writes in one commit
+MAX_COMMIT_WRITES = 500
+
+# Expenses accepted by a single /expenses/addMany call, leaving room in the
+# commit for the rollup update
+MAX_BATCH_EXPENSES = MAX_COMMIT_WRITES - 1
+
+def merchant_key(name: str) -> str:
+    """Normalized merchant name used for expense queries and merchant doc IDs"""
+    return name.strip().casefold()
+
+def expense_record(userId: str, expense: Expense, date: str) -> dict:
+    return {
+        **expense.model_dump(mode='python'),
+        "merchantKey": merchant_key(expense.item),
+        "date": date,
+        "yearMonth": date[:7],
+        "createdAt": _SERVER_TS,
+        "userId": userId
+    }
+
 @app.post("/expenses/add")
-async def add_expense(userId: str, expense: Expense):
+async def add_expense(request: Request, userId: str, expense: Expense):
     """
     Add a new expense to Firestore
     
@@ -107,95 +518,239 @@ async def add_expense(userId: str, expense: Expense):
         "source": "manual"
     }
     """
-    try:
-        expense_data = {
-            **expense.dict(),
-            "date": datetime.now().isoformat(),
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "userId": userId
-        }
-        
-        ref = db.collection('users').document(userId).collection('expenses')
-        doc = ref.add(expense_data)
+    db = request.app.state.db.client()
+    date = datetime.now(UTC).isoformat(timespec='seconds')
+    expense_data = expense_record(userId, expense, date)
+    
+    ref = expenses_ref(db, userId)
+    doc = ref.document()
+    
+    # Write the expense and bump the rollup atomically
+    batch = db.batch()
+    batch.set(doc, expense_data)
+    batch.set(rollup_ref(db, userId), as_increments(aggregate_rollup([expense_row(expense_data)])), merge=True)
+    await batch.commit()
+    _totals_cache.pop(userId, None)
+    
+    return {
+        "success": True,
+        "message": "Expense added successfully",
+        "expenseId": doc.id
+    }
+
+@app.post("/expenses/addMany")
+async def add_many_expenses(request: Request, userId: str, expenses: List[Expense]):
+    """
+    Add up to 499 expenses in one call, e.g. when replaying SMS-parsed expenses
+    
+    All expenses and a combined rollup update are written in one atomic
+    batch commit. A rollup touching more than 500 totals/counts (roughly
+    70+ distinct categories and months) goes over Firestore's per-document
+    transform limit, so its remainder is applied in follow-up commits.
+    """
+    db = request.app.state.db.client()
+    if len(expenses) > MAX_BATCH_EXPENSES:
+        raise ValueError(f"At most {MAX_BATCH_EXPENSES} expenses per call, got {len(expenses)}")
+    
+    date = datetime.now(UTC).isoformat(timespec='seconds')
+    ref = expenses_ref(db, userId)
+    
+    batch = db.batch()
+    rows = []
+    expense_ids = []
+    
+    for expense in expenses:
+        expense_data = expense_record(userId, expense, date)
+        doc = ref.document()
+        batch.set(doc, expense_data)
+        rows.append(expense_row(expense_data))
+        expense_ids.append(doc.id)
+    
+    if expense_ids:
+        rollup_doc = rollup_ref(db, userId)
+        first, *rest = split_rollup(aggregate_rollup(rows))
+        batch.set(rollup_doc, as_increments(first), merge=True)
+        await batch.commit()
         
-        return {
-            "success": True,
-            "message": "Expense added successfully",
-            "expenseId": doc[1].id
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        for part in rest:
+            await rollup_doc.set(as_increments(part), merge=True)
+        _totals_cache.pop(userId, None)
+    
+    return {
+        "success": True,
+        "message": f"{len(expense_ids)} expense(s) added successfully",
+        "expenseIds": expense_ids
+    }
+
+MAX_PAGE_SIZE = 500
+
+async def list_expenses(db, userId: str, type: Optional[str] = None, limit: int = 50, startAfter: Optional[str] = None):
+    """
+    Fetch one page of expenses, newest first
+
+    Returns: (expenses, nextCursor)
+    """
+    ref = expenses_ref(db, userId)
+    query = ref.order_by('date', direction=_DESC)
+    
+    if type:
+        query = query.where('type', '==', type)
+    
+    # List view only needs these fields, skip transferring the rest
+    query = query.select(['item', 'amount', 'type', 'date', 'category']).limit(limit)
+    
+    if startAfter:
+        cursor = await ref.document(startAfter).get()
+        if not cursor.exists:
+            raise ValueError(f"Unknown cursor: {startAfter}")
+        query = query.start_after(cursor)
+    
+    docs = query.stream()
+    expenses = []
+    
+    async for doc in docs:
+        expense_data = doc.to_dict()
+        expense_data['id'] = doc.id
+        expenses.append(expense_data)
+    
+    # A short page means there is nothing after it
+    next_cursor = expenses[-1]['id'] if expenses and len(expenses) == limit else None
+    return expenses, next_cursor
 
 @app.get("/expenses/{userId}")
-async def get_expenses(userId: str, type: Optional[str] = None):
+async def get_expenses(request: Request, userId: str, type: Optional[str] = None, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), startAfter: Optional[str] = None):
     """
-    Get all expenses for a user
+    Get a page of expenses for a user, newest first
     
     Query params:
     - type: "personal" or "business" (optional)
+    - limit: page size, 1-500 (default 50)
+    - startAfter: nextCursor from the previous page (optional)
     """
-    try:
-        ref = db.collection('users').document(userId).collection('expenses')
-        query = ref.order_by('date', direction=firestore.Query.DESCENDING)
-        
-        if type:
-            query = query.where('type', '==', type)
-        
-        docs = query.stream()
-        expenses = []
-        
-        for doc in docs:
-            expense_data = doc.to_dict()
-            expense_data['id'] = doc.id
-            expenses.append(expense_data)
-        
-        return {
-            "success": True,
-            "count": len(expenses),
-            "expenses": expenses
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    db = request.app.state.db.client()
+    expenses, next_cursor = await list_expenses(db, userId, type, limit, startAfter)
+    
+    # Selected fields are all JSON primitives, skip jsonable_encoder
+    return ORJSONResponse(content={
+        "success": True,
+        "count": len(expenses),
+        "expenses": expenses,
+        "nextCursor": next_cursor
+    })
+
+def _json_default(obj):
+    # Firestore timestamps are a datetime subclass orjson does not handle natively
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+@app.get("/expenses/{userId}/export")
+async def export_expenses(request: Request, userId: str, type: Optional[str] = None):
+    """
+    Stream every expense for a user as NDJSON, newest first
+    
+    One JSON object per line, written as documents arrive from Firestore,
+    so memory stays flat however large the history is.
+    """
+    db = request.app.state.db.client()
+    query = expenses_ref(db, userId).order_by('date', direction=_DESC)
+    
+    if type:
+        query = query.where('type', '==', type)
+    
+    async def generate_ndjson():
+        async for doc in query.stream():
+            yield orjson.dumps({**doc.to_dict(), 'id': doc.id}, default=_json_default) + b'\n'
+    
+    return StreamingResponse(generate_ndjson(), media_type="application/x-ndjson")
 
 @app.get("/expenses/totals/{userId}")
-async def get_expense_totals(userId: str):
+async def get_expense_totals(request: Request, userId: str):
     """
     Get total expenses by type (personal vs business)
     """
-    try:
-        ref = db.collection('users').document(userId).collection('expenses')
-        docs = ref.stream()
-        
-        totals = {
-            "total": 0,
-            "personal": 0,
-            "business": 0
-        }
-        
-        for doc in docs:
-            expense = doc.to_dict()
-            amount = expense.get('amount', 0)
-            totals['total'] += amount
-            
-            if expense.get('type') == 'personal':
-                totals['personal'] += amount
-            elif expense.get('type') == 'business':
-                totals['business'] += amount
+    db = request.app.state.db.client()
+    totals = _totals_cache.get(userId)
+    
+    if totals is None:
+        totals = totals_from_rollup(await get_rollup(db, userId))
+        _totals_cache[userId] = totals
+    
+    return {
+        "success": True,
+        "userId": userId,
+        "totals": totals
+    }
+
+@app.post("/expenses/rollup/backfill")
+async def backfill_rollup(request: Request, userId: str):
+    """
+    Rebuild the user's rollup from scratch
+
+    One-off for expenses written before rollups existed; streams the
+    expenses collection once, overwrites the summary document and fills
+    in merchantKey on expenses that lack it.
+
+    Safe to run while expenses are being added. The stream counts expenses
+    created up to a cutoff (the commit time of a marker write on the
+    summary). The overwrite then runs in a transaction that reads the
+    summary, which every add also writes, so no add can commit in between;
+    it counts the expenses created after the cutoff and records the cutoff
+    as backfilledAt.
+    """
+    db = request.app.state.db.client()
+    ref = expenses_ref(db, userId)
+    summary = rollup_ref(db, userId)
+    
+    cutoff = (await summary.set({'backfillStartedAt': _SERVER_TS}, merge=True)).update_time
+    
+    rows = []
+    batch = db.batch()
+    pending = 0
+    
+    async for doc in ref.stream():
+        expense = doc.to_dict()
+        created = expense.get('createdAt')
+        # Later ones are counted inside the transaction below
+        if not isinstance(created, datetime) or created <= cutoff:
+            rows.append(expense_row(expense))
         
-        return {
-            "success": True,
-            "userId": userId,
-            "totals": totals
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        if 'merchantKey' not in expense and expense.get('item'):
+            batch.update(doc.reference, {'merchantKey': merchant_key(expense['item'])})
+            pending += 1
+            if pending == MAX_COMMIT_WRITES:
+                await batch.commit()
+                batch = db.batch()
+                pending = 0
+    
+    if pending:
+        await batch.commit()
+    
+    @firestore.async_transactional
+    async def replace_rollup(transaction):
+        await summary.get(transaction=transaction)
+        late = [
+            expense_row(doc.to_dict())
+            async for doc in ref.where('createdAt', '>', cutoff).stream(transaction=transaction)
+        ]
+        transaction.set(summary, {**aggregate_rollup(rows + late), 'backfilledAt': cutoff})
+        return len(late)
+    
+    late_count = await replace_rollup(db.transaction())
+    _totals_cache.pop(userId, None)
+    
+    return {
+        "success": True,
+        "userId": userId,
+        "expensesProcessed": len(rows) + late_count
+    }
 
 # ============================================================================
 # AI QUERY ENDPOINTS
 # ============================================================================
 
 @app.post("/ai/merchant-spend")
-async def merchant_spend(query: MerchantQuery):
+async def merchant_spend(request: Request, query: MerchantQuery):
     """
     Query: "From this merchant how much have I spent?"
     
@@ -209,151 +764,123 @@ async def merchant_spend(query: MerchantQuery):
         "endDate": "2025-12-31"
     }
     """
-    try:
-        userId = query.userId
-        merchant = query.merchant.lower()
-        
-        # Build query
-        ref = db.collection('users').document(userId).collection('expenses')
-        docs = ref.where('item', '==', merchant).stream()
-        
-        total_amount = 0
-        count = 0
-        categories = {}
-        expenses_list = []
+    db = request.app.state.db.client()
+    userId = query.userId
+    merchant = merchant_key(query.merchant)
+    
+    # Build query, date window is filtered server-side
+    # (composite index: merchantKey ASC, date ASC)
+    ref = expenses_ref(db, userId)
+    q = ref.where('merchantKey', '==', merchant)
+    
+    if query.startDate:
+        q = q.where('date', '>=', query.startDate)
+    if query.endDate:
+        q = q.where('date', '<=', query.endDate)
+    
+    docs = q.order_by('date').stream()
+    
+    total_amount = 0
+    count = 0
+    categories = defaultdict(float)
+    expenses_list = []
+    
+    async for doc in docs:
+        expense = doc.to_dict()
+        amount = expense.get('amount', 0)
+        category = expense.get('category', 'uncategorized')
         
-        for doc in docs:
-            expense = doc.to_dict()
-            amount = expense.get('amount', 0)
-            category = expense.get('category', 'uncategorized')
-            
-            # Filter by date if provided
-            if query.startDate and query.endDate:
-                expense_date = expense.get('date', '')
-                if expense_date < query.startDate or expense_date > query.endDate:
-                    continue
-            
-            total_amount += amount
-            count += 1
-            categories[category] = categories.get(category, 0) + amount
-            
-            expenses_list.append({
-                'date': expense.get('date'),
-                'amount': amount,
-                'category': category,
-                'note': expense.get('note', '')
-            })
+        total_amount += amount
+        count += 1
+        categories[category] += amount
         
-        return {
-            "success": True,
-            "merchant": query.merchant,
-            "totalSpent": round(total_amount, 2),
-            "transactionCount": count,
-            "byCategory": categories,
-            "expenses": expenses_list
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        expenses_list.append({
+            'date': expense.get('date'),
+            'amount': amount,
+            'category': category,
+            'note': expense.get('note', '')
+        })
+    
+    return {
+        "success": True,
+        "merchant": query.merchant,
+        "totalSpent": round(total_amount, 2),
+        "transactionCount": count,
+        "byCategory": dict(categories),
+        "expenses": expenses_list
+    }
 
 @app.post("/ai/category-summary")
-async def category_summary(userId: str, type: Optional[str] = None):
+async def category_summary(request: Request, userId: str, type: Optional[str] = None):
     """
     Get spending breakdown by category
     
     Returns: Total per category, count, percentage
     """
-    try:
-        ref = db.collection('users').document(userId).collection('expenses')
-        docs = ref.stream()
-        
-        categories = {}
-        total = 0
-        
-        for doc in docs:
-            expense = doc.to_dict()
-            
-            # Filter by type if provided
-            if type and expense.get('type') != type:
-                continue
-            
-            category = expense.get('category', 'uncategorized')
-            amount = expense.get('amount', 0)
-            
-            if category not in categories:
-                categories[category] = {'total': 0, 'count': 0}
-            
-            categories[category]['total'] += amount
-            categories[category]['count'] += 1
-            total += amount
-        
-        # Calculate percentages
-        for cat in categories:
-            cat_total = categories[cat]['total']
-            percentage = (cat_total / total * 100) if total > 0 else 0
-            categories[cat]['percentage'] = round(percentage, 2)
-        
-        return {
-            "success": True,
-            "userId": userId,
-            "type": type or "all",
-            "totalSpent": round(total, 2),
-            "categories": categories
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    db = request.app.state.db.client()
+    scope = await get_rollup(db, userId, type)
+    
+    return {
+        "success": True,
+        "userId": userId,
+        "type": type or "all",
+        "totalSpent": round(scope.get('total', 0), 2),
+        "categories": category_breakdown(scope)
+    }
 
 @app.post("/ai/monthly-trend")
-async def monthly_trend(userId: str, type: Optional[str] = None):
+async def monthly_trend(request: Request, userId: str, type: Optional[str] = None):
     """
     Get monthly spending trend
     
     Returns: Spending by month for last 12 months
     """
-    try:
-        ref = db.collection('users').document(userId).collection('expenses')
-        docs = ref.stream()
-        
-        monthly_data = {}
-        
-        for doc in docs:
-            expense = doc.to_dict()
-            
-            # Filter by type if provided
-            if type and expense.get('type') != type:
-                continue
-            
-            date_str = expense.get('date', '')
-            if not date_str:
-                continue
-            
-            # Extract year-month
-            month_key = date_str[:7]  # "2025-01"
-            amount = expense.get('amount', 0)
-            
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {'total': 0, 'count': 0}
-            
-            monthly_data[month_key]['total'] += amount
-            monthly_data[month_key]['count'] += 1
-        
-        # Sort by month
-        sorted_months = sorted(monthly_data.items())
-        
-        return {
-            "success": True,
-            "userId": userId,
-            "type": type or "all",
-            "trend": dict(sorted_months)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    db = request.app.state.db.client()
+    scope = await get_rollup(db, userId, type)
+    
+    return {
+        "success": True,
+        "userId": userId,
+        "type": type or "all",
+        "trend": monthly_breakdown(scope)
+    }
+
+# ============================================================================
+# DASHBOARD
+# ============================================================================
+
+@app.get("/dashboard/{userId}")
+async def dashboard(request: Request, userId: str, type: Optional[str] = None):
+    """
+    Totals, category summary, monthly trend and latest expenses in one call
+    
+    The rollup read and the recent-expenses query run concurrently.
+    """
+    db = request.app.state.db.client()
+    rollup, (recent, next_cursor) = await asyncio.gather(
+        get_rollup(db, userId),
+        list_expenses(db, userId, type, limit=10)
+    )
+    scope = rollup_scope(rollup, type)
+    
+    return {
+        "success": True,
+        "userId": userId,
+        "type": type or "all",
+        "totals": totals_from_rollup(rollup),
+        "totalSpent": round(scope.get('total', 0), 2),
+        "categories": category_breakdown(scope),
+        "trend": monthly_breakdown(scope),
+        "recentExpenses": recent,
+        "nextCursor": next_cursor
+    }
 
 # ============================================================================
 # MERCHANT MEMORY ENDPOINTS
 # ============================================================================
 
 @app.post("/merchants/save")
-async def save_merchant(userId: str, merchant: str, category: str, type: str):
+async def save_merchant(request: Request, userId: str, merchant: str, category: str, type: str):
     """
     Save merchant categorization for auto-categorize on future SMS
     
@@ -364,94 +891,97 @@ async def save_merchant(userId: str, merchant: str, category: str, type: str):
         "type": "business"
     }
     """
-    try:
-        merchant_data = {
-            "normalizedName": merchant.lower(),
-            "defaultCategory": category,
-            "defaultType": type,
-            "userId": userId,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "lastUsed": firestore.SERVER_TIMESTAMP
-        }
-        
-        db.collection('merchants').document(f"{userId}_{merchant.lower()}").set(merchant_data)
-        
-        return {
-            "success": True,
-            "message": f"Merchant '{merchant}' saved with category '{category}'"
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    db = request.app.state.db.client()
+    key = f"{userId}_{merchant_key(merchant)}"
+    _merchant_cache.pop(key, None)
+    
+    merchant_data = {
+        "normalizedName": merchant_key(merchant),
+        "defaultCategory": category,
+        "defaultType": type,
+        "userId": userId,
+        "createdAt": _SERVER_TS,
+        "lastUsed": _SERVER_TS
+    }
+    
+    await db.collection('merchants').document(key).set(merchant_data)
+    _merchant_cache[key] = (category, type, True)
+    
+    return {
+        "success": True,
+        "message": f"Merchant '{merchant}' saved with category '{category}'"
+    }
 
 @app.get("/merchants/lookup/{userId}/{merchant}")
-async def lookup_merchant(userId: str, merchant: str):
+async def lookup_merchant(request: Request, userId: str, merchant: str):
     """
     Look up saved merchant categorization
     
     Returns: Category and type if found, null otherwise
     """
-    try:
-        doc = db.collection('merchants').document(f"{userId}_{merchant.lower()}").get()
-        
-        if doc.exists:
-            data = doc.to_dict()
-            return {
-                "success": True,
-                "found": True,
-                "merchant": merchant,
-                "category": data.get('defaultCategory'),
-                "type": data.get('defaultType')
-            }
-        else:
-            return {
-                "success": True,
-                "found": False,
-                "merchant": merchant
-            }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    db = request.app.state.db.client()
+    key = f"{userId}_{merchant_key(merchant)}"
+    cached = _merchant_cache.get(key)
+    
+    if cached is None:
+        doc = await db.collection('merchants').document(key).get()
+        data = doc.to_dict() or {}
+        cached = (data.get('defaultCategory'), data.get('defaultType'), doc.exists)
+        _merchant_cache[key] = cached
+    
+    category, type, exists = cached
+    
+    if exists:
+        return {
+            "success": True,
+            "found": True,
+            "merchant": merchant,
+            "category": category,
+            "type": type
+        }
+    else:
+        return {
+            "success": True,
+            "found": False,
+            "merchant": merchant
+        }
 
 # ============================================================================
 # COMPANY ENDPOINTS (For Future Use)
 # ============================================================================
 
 @app.post("/companies/create")
-async def create_company(userId: str, company: Company):
+async def create_company(request: Request, userId: str, company: Company):
     """
     Create a new company (for business subscriptions)
     """
-    try:
-        company_data = {
-            "name": company.name,
-            "ownerUserId": userId,
-            "subscriptionStatus": company.subscriptionStatus,
-            "createdAt": firestore.SERVER_TIMESTAMP
-        }
-        
-        ref = db.collection('companies').add(company_data)
-        
-        return {
-            "success": True,
-            "message": "Company created successfully",
-            "companyId": ref[1].id
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    db = request.app.state.db.client()
+    company_data = {
+        "name": company.name,
+        "ownerUserId": userId,
+        "subscriptionStatus": company.subscriptionStatus,
+        "createdAt": _SERVER_TS
+    }
+    
+    ref = await db.collection('companies').add(company_data)
+    
+    return {
+        "success": True,
+        "message": "Company created successfully",
+        "companyId": ref[1].id
+    }
 
 @app.post("/companies/{companyId}/invite-employee")
 async def invite_employee(companyId: str, employeeEmail: str, role: str = "employee"):
     """
     Invite an employee to a company
     """
-    try:
-        # In production, send email invitation
-        return {
-            "success": True,
-            "message": f"Invitation sent to {employeeEmail}",
-            "role": role
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # In production, send email invitation
+    return {
+        "success": True,
+        "message": f"Invitation sent to {employeeEmail}",
+        "role": role
+    }
 
 # ============================================================================
 # APPROVAL ENDPOINTS (For Future Use)
@@ -462,51 +992,55 @@ async def get_pending_approvals(userId: str):
     """
     Get pending expense approvals for manager/owner
     """
-    try:
-        # Query expenses with status "pending" for this user's company
-        return {
-            "success": True,
-            "userId": userId,
-            "pendingCount": 0,
-            "approvals": []
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # Query expenses with status "pending" for this user's company
+    return {
+        "success": True,
+        "userId": userId,
+        "pendingCount": 0,
+        "approvals": []
+    }
 
 # ============================================================================
 # ROOT ENDPOINT
 # ============================================================================
 
+# Static, so serialized once at import
+_ROOT_BODY = orjson.dumps({
+    "service": "Money Monitor API",
+    "version": "1.0.0",
+    "endpoints": {
+        "health": "GET /health",
+        "expenses": {
+            "add": "POST /expenses/add",
+            "addMany": "POST /expenses/addMany",
+            "list": "GET /expenses/{userId}",
+            "export": "GET /expenses/{userId}/export",
+            "totals": "GET /expenses/totals/{userId}",
+            "backfillRollup": "POST /expenses/rollup/backfill"
+        },
+        "ai": {
+            "merchantSpend": "POST /ai/merchant-spend",
+            "categorySummary": "POST /ai/category-summary",
+            "monthlyTrend": "POST /ai/monthly-trend"
+        },
+        "dashboard": "GET /dashboard/{userId}",
+        "merchants": {
+            "save": "POST /merchants/save",
+            "lookup": "GET /merchants/lookup/{userId}/{merchant}"
+        },
+        "companies": {
+            "create": "POST /companies/create",
+            "inviteEmployee": "POST /companies/{companyId}/invite-employee"
+        }
+    }
+})
+
 @app.get("/")
 async def root():
     """
     Root endpoint with API documentation
     """
-    return {
-        "service": "Money Monitor API",
-        "version": "1.0.0",
-        "endpoints": {
-            "health": "GET /health",
-            "expenses": {
-                "add": "POST /expenses/add",
-                "list": "GET /expenses/{userId}",
-                "totals": "GET /expenses/totals/{userId}"
-            },
-            "ai": {
-                "merchantSpend": "POST /ai/merchant-spend",
-                "categorySummary": "POST /ai/category-summary",
-                "monthlyTrend": "POST /ai/monthly-trend"
-            },
-            "merchants": {
-                "save": "POST /merchants/save",
-                "lookup": "GET /merchants/lookup/{userId}/{merchant}"
-            },
-            "companies": {
-                "create": "POST /companies/create",
-                "inviteEmployee": "POST /companies/{companyId}/invite-employee"
-            }
-        }
-    }
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 # ============================================================================
 # RUN SERVER
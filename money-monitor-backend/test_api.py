@@ -2,10 +2,15 @@
 """
 Test Script for Money Monitor API
 Run this after starting the server to verify all endpoints work
+Requires httpx: pip install httpx
 """
 
-import requests
+import asyncio
+import contextvars
+import httpx
+import io
 import json
+import sys
 from datetime import datetime, timedelta
 
 BASE_URL = "http://localhost:8000"
@@ -19,9 +24,7 @@ class Colors:
     END = '\033[0m'
 
 def print_header(text):
-    print(f"\n{Colors.BLUE}{'='*60}")
-    print(f"{text}")
-    print(f"{'='*60}{Colors.END}\n")
+    sys.stdout.write(f"\n{Colors.BLUE}{'='*60}\n{text}\n{'='*60}{Colors.END}\n\n")
 
 def print_success(text):
     print(f"{Colors.GREEN}✓ {text}{Colors.END}")
@@ -36,10 +39,10 @@ def print_info(text):
 # TEST 1: Health Check
 # ============================================================================
 
-def test_health_check():
+async def test_health_check(client):
     print_header("TEST 1: Health Check")
     try:
-        response = requests.get(f"{BASE_URL}/health")
+        response = await client.get("/health")
         if response.status_code == 200:
             data = response.json()
             print_success(f"Server is healthy: {data['service']} v{data['version']}")
@@ -57,7 +60,7 @@ def test_health_check():
 # TEST 2: Add Expense
 # ============================================================================
 
-def test_add_expense():
+async def test_add_expense(client):
     print_header("TEST 2: Add Expense")
     
     expense_data = {
@@ -70,8 +73,8 @@ def test_add_expense():
     }
     
     try:
-        response = requests.post(
-            f"{BASE_URL}/expenses/add?userId={TEST_USER_ID}",
+        response = await client.post(
+            f"/expenses/add?userId={TEST_USER_ID}",
             json=expense_data,
             headers={"Content-Type": "application/json"}
         )
@@ -94,11 +97,11 @@ def test_add_expense():
 # TEST 3: Get Expense Totals
 # ============================================================================
 
-def test_get_totals():
+async def test_get_totals(client):
     print_header("TEST 3: Get Expense Totals")
     
     try:
-        response = requests.get(f"{BASE_URL}/expenses/totals/{TEST_USER_ID}")
+        response = await client.get(f"/expenses/totals/{TEST_USER_ID}")
         
         if response.status_code == 200:
             data = response.json()
@@ -121,11 +124,11 @@ def test_get_totals():
 # TEST 4: Get All Expenses
 # ============================================================================
 
-def test_get_expenses():
+async def test_get_expenses(client):
     print_header("TEST 4: Get All Expenses")
     
     try:
-        response = requests.get(f"{BASE_URL}/expenses/{TEST_USER_ID}")
+        response = await client.get(f"/expenses/{TEST_USER_ID}")
         
         if response.status_code == 200:
             data = response.json()
@@ -148,12 +151,12 @@ def test_get_expenses():
 # TEST 5: Save Merchant
 # ============================================================================
 
-def test_save_merchant():
+async def test_save_merchant(client):
     print_header("TEST 5: Save Merchant")
     
     try:
-        response = requests.post(
-            f"{BASE_URL}/merchants/save?userId={TEST_USER_ID}&merchant=Shell%20Petrol&category=transport&type=personal"
+        response = await client.post(
+            f"/merchants/save?userId={TEST_USER_ID}&merchant=Shell%20Petrol&category=transport&type=personal"
         )
         
         if response.status_code == 200:
@@ -173,12 +176,12 @@ def test_save_merchant():
 # TEST 6: Lookup Merchant
 # ============================================================================
 
-def test_lookup_merchant():
+async def test_lookup_merchant(client):
     print_header("TEST 6: Lookup Merchant")
     
     try:
-        response = requests.get(
-            f"{BASE_URL}/merchants/lookup/{TEST_USER_ID}/Shell%20Petrol"
+        response = await client.get(
+            f"/merchants/lookup/{TEST_USER_ID}/Shell%20Petrol"
         )
         
         if response.status_code == 200:
@@ -203,12 +206,12 @@ def test_lookup_merchant():
 # TEST 7: Category Summary
 # ============================================================================
 
-def test_category_summary():
+async def test_category_summary(client):
     print_header("TEST 7: Category Summary")
     
     try:
-        response = requests.post(
-            f"{BASE_URL}/ai/category-summary?userId={TEST_USER_ID}&type=personal"
+        response = await client.post(
+            f"/ai/category-summary?userId={TEST_USER_ID}&type=personal"
         )
         
         if response.status_code == 200:
@@ -235,12 +238,12 @@ def test_category_summary():
 # TEST 8: Monthly Trend
 # ============================================================================
 
-def test_monthly_trend():
+async def test_monthly_trend(client):
     print_header("TEST 8: Monthly Trend")
     
     try:
-        response = requests.post(
-            f"{BASE_URL}/ai/monthly-trend?userId={TEST_USER_ID}"
+        response = await client.post(
+            f"/ai/monthly-trend?userId={TEST_USER_ID}"
         )
         
         if response.status_code == 200:
@@ -266,7 +269,7 @@ def test_monthly_trend():
 # TEST 9: Merchant Spend Query (AI)
 # ============================================================================
 
-def test_merchant_spend():
+async def test_merchant_spend(client):
     print_header("TEST 9: Merchant Spend Query (AI)")
     
     query_data = {
@@ -277,8 +280,8 @@ def test_merchant_spend():
     }
     
     try:
-        response = requests.post(
-            f"{BASE_URL}/ai/merchant-spend",
+        response = await client.post(
+            "/ai/merchant-spend",
             json=query_data,
             headers={"Content-Type": "application/json"}
         )
@@ -309,7 +312,31 @@ def test_merchant_spend():
 # MAIN TEST RUNNER
 # ============================================================================
 
-def run_all_tests():
+class TaskLocalStdout:
+    """sys.stdout stand-in that sends each test task's prints to its own buffer"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = contextvars.ContextVar("buffer", default=None)
+
+    def write(self, text):
+        return (self.buffer.get() or self.stream).write(text)
+
+    def flush(self):
+        (self.buffer.get() or self.stream).flush()
+
+async def run_isolated(stdout, test_func, client):
+    """Run one test as its own task, returning (result, captured output)"""
+    buffer = io.StringIO()
+    stdout.buffer.set(buffer)  # gather() gives each task a copy of the context
+    try:
+        result = await test_func(client)
+    except Exception as e:
+        print_error(f"Test failed with exception: {e}")
+        result = False
+    return result, buffer.getvalue()
+
+async def run_all_tests():
     print(f"\n{Colors.BLUE}")
     print("╔════════════════════════════════════════════════════════╗")
     print("║     Money Monitor API - Verification Test Suite       ║")
@@ -319,27 +346,43 @@ def run_all_tests():
     print_info(f"Testing against: {BASE_URL}")
     print_info(f"Test User ID: {TEST_USER_ID}\n")
     
-    tests = [
-        ("Health Check", test_health_check),
-        ("Add Expense", test_add_expense),
-        ("Get Totals", test_get_totals),
-        ("Get Expenses", test_get_expenses),
-        ("Save Merchant", test_save_merchant),
-        ("Lookup Merchant", test_lookup_merchant),
-        ("Category Summary", test_category_summary),
-        ("Monthly Trend", test_monthly_trend),
-        ("Merchant Spend (AI)", test_merchant_spend),
+    # Tests within a stage run concurrently; a stage starts once the previous
+    # one is done, so reads see the expense and merchant written before them
+    stages = [
+        [("Health Check", test_health_check)],
+        [
+            ("Add Expense", test_add_expense),
+            ("Save Merchant", test_save_merchant),
+        ],
+        [
+            ("Get Totals", test_get_totals),
+            ("Get Expenses", test_get_expenses),
+            ("Lookup Merchant", test_lookup_merchant),
+            ("Category Summary", test_category_summary),
+            ("Monthly Trend", test_monthly_trend),
+            ("Merchant Spend (AI)", test_merchant_spend),
+        ],
     ]
     
     results = []
     
-    for test_name, test_func in tests:
-        try:
-            result = test_func()
-            results.append((test_name, result))
-        except Exception as e:
-            print_error(f"Test failed with exception: {e}")
-            results.append((test_name, False))
+    stdout = sys.stdout = TaskLocalStdout(sys.stdout)
+    try:
+        # One pooled client so every request reuses a keep-alive connection
+        async with httpx.AsyncClient(
+            base_url=BASE_URL,
+            limits=httpx.Limits(max_keepalive_connections=16)
+        ) as client:
+            for stage in stages:
+                outcomes = await asyncio.gather(
+                    *(run_isolated(stdout, test_func, client) for _, test_func in stage)
+                )
+                # gather() keeps declaration order regardless of completion order
+                for (test_name, _), (result, output) in zip(stage, outcomes):
+                    sys.stdout.write(output)
+                    results.append((test_name, result))
+    finally:
+        sys.stdout = stdout.stream
     
     # Summary
     print_header("TEST SUMMARY")
@@ -347,11 +390,13 @@ def run_all_tests():
     passed = sum(1 for _, result in results if result)
     total = len(results)
     
+    lines = []
     for test_name, result in results:
         status = f"{Colors.GREEN}PASS{Colors.END}" if result else f"{Colors.RED}FAIL{Colors.END}"
-        print(f"{status} - {test_name}")
+        lines.append(f"{status} - {test_name}\n")
     
-    print(f"\n{Colors.BLUE}Results: {passed}/{total} tests passed{Colors.END}\n")
+    lines.append(f"\n{Colors.BLUE}Results: {passed}/{total} tests passed{Colors.END}\n\n")
+    sys.stdout.write(''.join(lines))
     
     if passed == total:
         print_success("All tests passed! Your API is working correctly. 🎉")
@@ -359,4 +404,4 @@ def run_all_tests():
         print_error(f"{total - passed} test(s) failed. Check the output above.")
 
 if __name__ == "__main__":
-    run_all_tests()
+    asyncio.run(run_all_tests())
@@ -7,8 +7,14 @@
 # ==========================================
 
 import os
+import re
 import sys
+import json
+import mmap
+import shutil
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
@@ -24,48 +30,151 @@ class Colors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+# Prefixes/suffixes built once so the print helpers only concatenate
+_HEADER_PREFIX = f"\n{Colors.HEADER}{Colors.BOLD}{'='*70}\n"
+_HEADER_SUFFIX = f"\n{'='*70}{Colors.ENDC}\n\n"
+_OK_PREFIX = Colors.OKGREEN + '✅ '
+_INFO_PREFIX = Colors.OKCYAN + 'ℹ️  '
+_WARN_PREFIX = Colors.WARNING + '⚠️  '
+_ERR_PREFIX = Colors.FAIL + '❌ '
+_SUFFIX = Colors.ENDC + '\n'
+
 def print_header(text):
-    print(f"\n{Colors.HEADER}{Colors.BOLD}{'='*70}")
-    print(f"{text}")
-    print(f"{'='*70}{Colors.ENDC}\n")
+    sys.stdout.write(_HEADER_PREFIX + text + _HEADER_SUFFIX)
 
 def print_success(text):
-    print(f"{Colors.OKGREEN}✅ {text}{Colors.ENDC}")
+    sys.stdout.write(_OK_PREFIX + text + _SUFFIX)
 
 def print_info(text):
-    print(f"{Colors.OKCYAN}ℹ️  {text}{Colors.ENDC}")
+    sys.stdout.write(_INFO_PREFIX + text + _SUFFIX)
 
 def print_warning(text):
-    print(f"{Colors.WARNING}⚠️  {text}{Colors.ENDC}")
+    sys.stdout.write(_WARN_PREFIX + text + _SUFFIX)
 
 def print_error(text):
-    print(f"{Colors.FAIL}❌ {text}{Colors.ENDC}")
+    sys.stdout.write(_ERR_PREFIX + text + _SUFFIX)
 
 # ==========================================
 # STEP 1: CHECK FLUTTER
 # ==========================================
-def check_flutter():
-    """Check if Flutter is installed"""
-    print_header("✔️  CHECKING FLUTTER")
+# Resolved once: one PATH lookup for the whole run, and a missing flutter is
+# known up front instead of surfacing as an OSError from Popen.
+# At most two flutter processes run per setup (--version, usually served from
+# VERSION_CACHE, and pub get); `flutter daemon` can serve neither, so there is
+# no long-lived flutter process to share between them.
+FLUTTER = shutil.which('flutter') or 'flutter'
+VERSION_CACHE = Path.home() / '.money_monitor_cache.json'
+
+# Files inside the SDK that `flutter upgrade` rewrites; the bin/flutter
+# launcher itself is left untouched by an upgrade
+SDK_VERSION_STAMPS = ('bin/cache/flutter.version.json', 'bin/cache/flutter_tools.stamp', 'version')
+
+def flutter_cache_key():
+    """Identify the flutter install by launcher (path, mtime, size) plus SDK
+    version stamp mtimes, or None if flutter is missing"""
+    try:
+        st = os.stat(FLUTTER)
+    except OSError:
+        return None
+    
+    sdk = Path(FLUTTER).resolve().parent.parent
+    stamps = []
+    for name in SDK_VERSION_STAMPS:
+        try:
+            stamps.append([name, (sdk / name).stat().st_mtime_ns])
+        except OSError:
+            pass
+    return [FLUTTER, st.st_mtime_ns, st.st_size, stamps]
+
+def load_cached_version(key):
+    """Return the cached `flutter --version` output if it was for this install"""
+    if not key[-1]:
+        # No SDK stamp found, an upgrade would go unnoticed
+        return None
+    try:
+        cache = json.loads(VERSION_CACHE.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if isinstance(cache, dict) and cache.get('key') == key:
+        return cache.get('version')
+    return None
+
+def save_cached_version(key, version):
+    """Remember the `flutter --version` output for this install"""
+    if not key[-1]:
+        return
+    try:
+        VERSION_CACHE.write_text(
+            json.dumps({'key': key, 'version': version}), encoding='utf-8'
+        )
+    except OSError:
+        pass
+
+def start_flutter_version():
+    """Launch `flutter --version` in the background
+    
+    The child runs while the user is typing the Firebase config, so its
+    startup cost is hidden behind input. Returns the cached version string
+    if the same flutter binary was checked before, or None if flutter is
+    missing.
+    """
+    key = flutter_cache_key()
+    if key is None:
+        return None
+    
+    cached = load_cached_version(key)
+    if cached is not None:
+        return cached
     
     try:
-        result = subprocess.run(
-            ['flutter', '--version'],
-            capture_output=True,
-            text=True,
-            timeout=10
+        return subprocess.Popen(
+            [FLUTTER, '--version'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            # With an absolute executable, no cwd and close_fds off, CPython
+            # spawns via posix_spawn; our own fds are non-inheritable anyway
+            close_fds=False,
+            text=True
         )
-        
-        if result.returncode == 0:
-            print_success("Flutter is installed!")
-            print_info(result.stdout)
-            return True
-        else:
-            print_error("Flutter not found")
-            return False
-    except:
+    except OSError:
+        return None
+
+def check_flutter(version_proc):
+    """Check if Flutter is installed, using the result of start_flutter_version()"""
+    print_header("✔️  CHECKING FLUTTER")
+    
+    if version_proc is None:
         print_error("Flutter not found in PATH")
         return False
+    
+    if isinstance(version_proc, str):
+        print_success("Flutter is installed!")
+        print_info(version_proc)
+        return True
+    
+    try:
+        stdout = version_proc.communicate(timeout=10)[0]
+    except subprocess.TimeoutExpired:
+        version_proc.kill()
+        version_proc.communicate()
+        print_error("Flutter not found")
+        return False
+    
+    if version_proc.returncode == 0:
+        save_cached_version(flutter_cache_key(), stdout)
+        print_success("Flutter is installed!")
+        print_info(stdout)
+        return True
+    else:
+        print_error("Flutter not found")
+        return False
+
+def require_flutter(version_proc):
+    """Exit with install instructions unless check_flutter() succeeds"""
+    if not check_flutter(version_proc):
+        print_error("Please install Flutter first!")
+        print_info("Download from: https://flutter.dev/docs/get-started/install")
+        sys.exit(1)
 
 # ==========================================
 # STEP 2: GET FIREBASE CONFIG
@@ -105,62 +214,78 @@ def get_firebase_config():
 # ==========================================
 # STEP 3: CREATE FIREBASE CONFIG DART FILE
 # ==========================================
-def create_firebase_config(project_path, config):
-    """Create firebase_config.dart file"""
-    print_header("🔑 CREATING FIREBASE CONFIG")
-    
-    firebase_config_content = f'''// FILE: lib/firebase_config.dart
+# Parsed once at import; {name} placeholders are filled from the config dict
+_FIREBASE_CONFIG_TEMPLATE = '''// FILE: lib/firebase_config.dart
 // Firebase configuration for Money Monitor app
-// Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+// Generated: {generated}
 
 class FirebaseConfig {{
   // Web API Key (from Firebase Console)
-  static const String apiKey = "{config['apiKey']}";
+  static const String apiKey = "{apiKey}";
   
   // Authentication domain
-  static const String authDomain = "{config['authDomain']}";
+  static const String authDomain = "{authDomain}";
   
   // Firebase project ID
-  static const String projectId = "{config['projectId']}";
+  static const String projectId = "{projectId}";
   
   // Cloud Storage bucket
-  static const String storageBucket = "{config['storageBucket']}";
+  static const String storageBucket = "{storageBucket}";
   
   // Messaging sender ID
-  static const String messagingSenderId = "{config['messagingSenderId']}";
+  static const String messagingSenderId = "{messagingSenderId}";
   
   // Firebase app ID
-  static const String appId = "{config['appId']}";
+  static const String appId = "{appId}";
 }}
 '''
+
+def create_firebase_config(project_path, config):
+    """Build the firebase_config.dart file as a (path, content) pair"""
+    print_header("🔑 CREATING FIREBASE CONFIG")
+    
+    firebase_config_content = _FIREBASE_CONFIG_TEMPLATE.format_map(
+        dict(config, generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    )
     
     lib_path = project_path / "lib"
     config_file = lib_path / "firebase_config.dart"
     
-    try:
-        with open(config_file, 'w') as f:
-            f.write(firebase_config_content)
-        print_success(f"Created: firebase_config.dart")
-        return True
-    except Exception as e:
-        print_error(f"Failed to create firebase_config.dart: {str(e)}")
-        return False
+    print_success("Prepared: firebase_config.dart")
+    return config_file, firebase_config_content
 
 # ==========================================
 # STEP 4: UPDATE PUBSPEC.YAML
 # ==========================================
+# The top-level dependencies block, up to where dev_dependencies starts
+_DEPS_RE = re.compile(r'^dependencies:.*?(?=^dev_dependencies)', re.DOTALL | re.MULTILINE)
+
 def update_pubspec(project_path):
-    """Update pubspec.yaml with Firebase dependencies"""
+    """Add the Firebase packages to pubspec.yaml in place
+    
+    The file is read and rewritten through one handle, and left untouched
+    when the Firebase packages are already there.
+    """
     print_header("📦 UPDATING DEPENDENCIES")
     
     pubspec_file = project_path / "pubspec.yaml"
     
     try:
-        with open(pubspec_file, 'r') as f:
-            content = f.read()
-        
-        # Add Firebase dependencies if not already present
-        if 'firebase_core' not in content:
+        with open(pubspec_file, 'r+b') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raw = b''
+            else:
+                # The map is closed before the truncate below, Windows requires it
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # Already set up: nothing to write
+                    if mm.find(b'firebase_core') != -1:
+                        print_info("pubspec.yaml already has Firebase packages")
+                        return True
+                    raw = mm[:]
+            
+            # Match what text mode would have read
+            content = raw.decode('utf-8').replace('\r\n', '\n')
+            
             # Find the dependencies section and add Firebase packages
             new_dependencies = '''dependencies:
   flutter:
@@ -171,14 +296,16 @@ def update_pubspec(project_path):
   google_sign_in: ^6.0.0
   provider: ^6.0.0'''
             
-            # Replace the dependencies section
-            if 'dependencies:' in content:
-                old_deps = content.split('dev_dependencies')[0]
-                rest = content.split('dev_dependencies')[1]
-                content = new_dependencies + '\n\ndev_dependencies' + rest
-        
-        with open(pubspec_file, 'w') as f:
-            f.write(content)
+            # Replace the dependencies section in a single pass
+            content, replaced = _DEPS_RE.subn(lambda m: new_dependencies + '\n\n', content, count=1)
+            if not replaced:
+                print_error("pubspec.yaml needs a dependencies: section followed by dev_dependencies:")
+                return False
+            
+            # Rewrite through the same handle instead of reopening for write
+            f.seek(0)
+            f.truncate()
+            f.write(content.encode('utf-8'))
         
         print_success("Updated pubspec.yaml with Firebase packages")
         return True
@@ -189,27 +316,70 @@ def update_pubspec(project_path):
 # ==========================================
 # STEP 5: RUN FLUTTER PUB GET
 # ==========================================
+def project_layout_error(project_path):
+    """Return why project_path can't be a Flutter project, or None if it looks fine"""
+    pubspec_file = project_path / "pubspec.yaml"
+    if not pubspec_file.is_file():
+        return "pubspec.yaml not found"
+    if not (project_path / "lib").is_dir():
+        return "lib/ directory not found"
+    try:
+        content = pubspec_file.read_bytes()
+    except OSError as e:
+        return f"Cannot read pubspec.yaml: {str(e)}"
+    if b'flutter' not in content:
+        return "pubspec.yaml does not declare a Flutter project"
+    return None
+
+PUB_GET_TIMEOUT = 300
+
+def _echo_lines(stream):
+    """Print a child's output line by line until it closes"""
+    for line in stream:
+        print(line, end='')
+
 def run_pub_get(project_path):
     """Run flutter pub get to install dependencies"""
     print_header("⬇️  INSTALLING DEPENDENCIES")
     
+    # pub get takes 30-60s just to report a broken project, so check locally first
+    layout_error = project_layout_error(project_path)
+    if layout_error:
+        print_error(f"Skipping flutter pub get: {layout_error}")
+        return False
+    
     print_info("Installing Flutter dependencies (this may take 2-5 minutes)...\n")
     
     try:
-        result = subprocess.run(
-            ['flutter', 'pub', 'get'],
+        # Stream output live instead of buffering minutes of it in memory
+        proc = subprocess.Popen(
+            [FLUTTER, 'pub', 'get'],
             cwd=str(project_path),
-            capture_output=True,
-            text=True,
-            timeout=300
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=1,
+            text=True
         )
         
-        if result.returncode == 0:
+        # Echo on a thread so the deadline below holds even if pub get hangs
+        reader = threading.Thread(target=_echo_lines, args=(proc.stdout,), daemon=True)
+        reader.start()
+        try:
+            returncode = proc.wait(timeout=PUB_GET_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            reader.join(timeout=1)
+            print_error(f"flutter pub get timed out after {PUB_GET_TIMEOUT}s")
+            return False
+        reader.join()
+        proc.stdout.close()
+        
+        if returncode == 0:
             print_success("Dependencies installed successfully!")
             return True
         else:
-            print_warning("Dependencies installation had issues")
-            print_info(result.stderr)
+            print_warning("Dependencies installation had issues (see output above)")
             return False
     except Exception as e:
         print_error(f"Error installing dependencies: {str(e)}")
@@ -218,11 +388,8 @@ def run_pub_get(project_path):
 # ==========================================
 # STEP 6: CREATE ENHANCED MAIN.DART
 # ==========================================
-def create_enhanced_main(project_path):
-    """Create enhanced main.dart with Firebase setup"""
-    print_header("🎯 CREATING ENHANCED MAIN.DART")
-    
-    main_dart_content = '''import 'package:flutter/material.dart';
+# Static Dart source, nothing is interpolated into it
+_MAIN_DART_TEMPLATE = '''import 'package:flutter/material.dart';
 import 'firebase_config.dart';
 
 void main() async {
@@ -384,18 +551,45 @@ class _AddExpenseDialogState extends State<AddExpenseDialog> {
   }
 }
 '''
+
+def create_enhanced_main(project_path):
+    """Build the enhanced main.dart as a (path, content) pair"""
+    print_header("🎯 CREATING ENHANCED MAIN.DART")
+    
+    main_dart_content = _MAIN_DART_TEMPLATE
     
     lib_path = project_path / "lib"
     main_file = lib_path / "main.dart"
     
+    print_success("Prepared enhanced main.dart with Money Monitor features")
+    return main_file, main_dart_content
+
+# ==========================================
+# WRITE GENERATED FILES
+# ==========================================
+def _write_file(pair):
+    """Write one (path, content) pair, returning the error instead of raising"""
+    path, content = pair
     try:
-        with open(main_file, 'w') as f:
-            f.write(main_dart_content)
-        print_success("Created enhanced main.dart with Money Monitor features")
-        return True
+        # UTF-8 with LF endings on every platform, the style Dart and pub expect
+        path.write_text(content, encoding='utf-8', newline='\n')
+        return None
     except Exception as e:
-        print_error(f"Failed to create main.dart: {str(e)}")
-        return False
+        return e
+
+def write_all_files(pairs):
+    """Write every (path, content) pair concurrently, True if all succeeded"""
+    print_header("💾 WRITING PROJECT FILES")
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        errors = list(pool.map(_write_file, pairs))
+    
+    for (path, _), error in zip(pairs, errors):
+        if error is None:
+            print_success(f"Wrote: {path.name}")
+        else:
+            print_error(f"Failed to write {path.name}: {str(error)}")
+    return not any(errors)
 
 # ==========================================
 # STEP 7: FINAL SUMMARY
@@ -404,34 +598,32 @@ def print_summary(project_path, config):
     """Print final summary"""
     print_header("✅ SETUP COMPLETE")
     
-    print(f"{Colors.OKGREEN}{Colors.BOLD}Money Monitor is ready!{Colors.ENDC}\n")
-    
-    print(f"{Colors.BOLD}Project Location:{Colors.ENDC}")
-    print(f"  {project_path}\n")
-    
-    print(f"{Colors.BOLD}Firebase Configuration:{Colors.ENDC}")
-    print(f"  Project ID: {config['projectId']}")
-    print(f"  Auth Domain: {config['authDomain']}\n")
-    
-    print(f"{Colors.BOLD}Files Created:{Colors.ENDC}")
-    print(f"  ✅ lib/firebase_config.dart")
-    print(f"  ✅ lib/main.dart (with Money Monitor app)")
-    print(f"  ✅ pubspec.yaml (Firebase packages added)\n")
-    
-    print(f"{Colors.BOLD}Next Steps:{Colors.ENDC}")
-    print(f"  1. Navigate to project:")
-    print(f"     cd {project_path}\n")
-    print(f"  2. Run the app:")
-    print(f"     flutter run -d chrome\n")
-    print(f"  3. See your Money Monitor app in Chrome!\n")
-    
-    print(f"{Colors.BOLD}Commands to Remember:{Colors.ENDC}")
-    print(f"  flutter run -d chrome      - Run in Chrome")
-    print(f"  flutter run -d edge        - Run in Edge")
-    print(f"  flutter pub get            - Update dependencies")
-    print(f"  r                          - Hot reload (while running)\n")
-    
-    print(f"{Colors.OKGREEN}{Colors.BOLD}🚀 Ready to launch!{Colors.ENDC}\n")
+    # Build the whole block, then write it once
+    lines = [
+        f"{Colors.OKGREEN}{Colors.BOLD}Money Monitor is ready!{Colors.ENDC}\n",
+        f"{Colors.BOLD}Project Location:{Colors.ENDC}",
+        f"  {project_path}\n",
+        f"{Colors.BOLD}Firebase Configuration:{Colors.ENDC}",
+        f"  Project ID: {config['projectId']}",
+        f"  Auth Domain: {config['authDomain']}\n",
+        f"{Colors.BOLD}Files Created:{Colors.ENDC}",
+        f"  ✅ lib/firebase_config.dart",
+        f"  ✅ lib/main.dart (with Money Monitor app)",
+        f"  ✅ pubspec.yaml (Firebase packages added)\n",
+        f"{Colors.BOLD}Next Steps:{Colors.ENDC}",
+        f"  1. Navigate to project:",
+        f"     cd {project_path}\n",
+        f"  2. Run the app:",
+        f"     flutter run -d chrome\n",
+        f"  3. See your Money Monitor app in Chrome!\n",
+        f"{Colors.BOLD}Commands to Remember:{Colors.ENDC}",
+        f"  flutter run -d chrome      - Run in Chrome",
+        f"  flutter run -d edge        - Run in Edge",
+        f"  flutter pub get            - Update dependencies",
+        f"  r                          - Hot reload (while running)\n",
+        f"{Colors.OKGREEN}{Colors.BOLD}🚀 Ready to launch!{Colors.ENDC}\n",
+    ]
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 # ==========================================
 # MAIN EXECUTION
@@ -441,13 +633,13 @@ def main():
     print_header("💰 MONEY MONITOR - COMPLETE SETUP")
     print("Setting up Flutter + Firebase + Money Monitor App\n")
     
-    # Step 1: Check Flutter
-    if not check_flutter():
-        print_error("Please install Flutter first!")
-        print_info("Download from: https://flutter.dev/docs/get-started/install")
-        sys.exit(1)
+    # Start the Flutter check now, it finishes while config is being typed
+    version_proc = start_flutter_version()
+    if version_proc is None:
+        # Already known to be missing, don't ask for the config first
+        require_flutter(version_proc)
     
-    # Step 2: Get or use existing project
+    # Step 1: Get or use existing project
     project_path = Path("C:/app/money_monitor")
     
     if not project_path.exists():
@@ -457,25 +649,26 @@ def main():
     
     print_success(f"Found project at: {project_path}\n")
     
-    # Step 3: Get Firebase config
+    # Step 2: Get Firebase config
     config = get_firebase_config()
     
-    # Step 4: Create Firebase config file
-    if not create_firebase_config(project_path, config):
-        print_warning("Failed to create Firebase config")
+    # Step 3: Check Flutter
+    require_flutter(version_proc)
     
-    # Step 5: Update pubspec.yaml
+    # Steps 4-6: Assemble Firebase config and main.dart, update pubspec.yaml
+    files = [create_firebase_config(project_path, config)]
     if not update_pubspec(project_path):
         print_warning("Failed to update pubspec.yaml")
+    files.append(create_enhanced_main(project_path))
     
-    # Step 6: Install dependencies
+    # Write the generated files in one pass
+    if not write_all_files(files):
+        print_warning("Some project files could not be written")
+    
+    # Step 7: Install dependencies
     if not run_pub_get(project_path):
         print_warning("Failed to install dependencies")
     
-    # Step 7: Create enhanced main.dart
-    if not create_enhanced_main(project_path):
-        print_warning("Failed to create main.dart")
-    
     # Step 8: Print summary
     print_summary(project_path, config)
 